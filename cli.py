@@ -5,21 +5,19 @@ SpinGenius CLI
 """
 
 import click
+import itertools
 import os
 import sys
 from pathlib import Path
 from colorama import init, Fore, Style
-from typing import Optional
-import difflib
+from typing import Optional, TYPE_CHECKING
 
 # 初始化colorama
 init(autoreset=True)
 
-# 导入核心模块
-from core.local_rewriter import LocalRewriter
-from core.api_rewriter import APIRewriter
-from processors.html_parser import HTMLParser
-from processors.term_protector import TermProtector
+# 核心模块在各子命令中按需导入，避免 --help / check 等命令加载不需要的依赖
+if TYPE_CHECKING:
+    from processors.html_parser import HTMLParser
 
 # 相似度检测器是可选的
 try:
@@ -29,42 +27,71 @@ except ImportError:
     SIMILARITY_AVAILABLE = False
 
 
+def colored(color: str, message: str) -> str:
+    """为消息添加颜色"""
+    return f"{color}{message}{Style.RESET_ALL}"
+
+
 def show_text_diff(original: str, rewritten: str, max_lines: int = 30):
     """显示文本差异对比"""
+    from processors.text_diff import unified_diff
+    
     original_lines = original.split('\n')
     rewritten_lines = rewritten.split('\n')
     
-    diff = difflib.unified_diff(
+    diff = unified_diff(
         original_lines,
         rewritten_lines,
         fromfile='原文',
-        tofile='改写后',
-        lineterm=''
+        tofile='改写后'
     )
     
-    print(f"\n{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
-    print(f"{Fore.CYAN}📝 文本差异对比 (Diff){Style.RESET_ALL}")
-    print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
+    print(colored(Fore.CYAN, '\n' + '=' * 60))
+    print(colored(Fore.CYAN, "📝 文本差异对比 (Diff)"))
+    print(colored(Fore.CYAN, '=' * 60 + '\n'))
     
-    count = 0
-    for line in diff:
-        if count >= max_lines:
-            print(f"{Fore.YELLOW}... (仅显示前{max_lines}行差异){Style.RESET_ALL}")
-            break
-        
+    for line in itertools.islice(diff, max_lines):
         if line.startswith('+') and not line.startswith('+++'):
-            print(f"{Fore.GREEN}{line}{Style.RESET_ALL}")
+            print(colored(Fore.GREEN, line))
         elif line.startswith('-') and not line.startswith('---'):
-            print(f"{Fore.RED}{line}{Style.RESET_ALL}")
+            print(colored(Fore.RED, line))
         elif line.startswith('@@'):
-            print(f"{Fore.CYAN}{line}{Style.RESET_ALL}")
+            print(colored(Fore.CYAN, line))
         else:
             print(line)
-        count += 1
+    
+    if next(diff, None) is not None:
+        print(colored(Fore.YELLOW, f"... (仅显示前{max_lines}行差异)"))
     
     print()
 
 
+def _extract_document(file_path: str, html_parser: 'HTMLParser'):
+    """读取文件并提取纯文本和代码块"""
+    content = Path(file_path).read_text(encoding='utf-8')
+    if not html_parser.is_html(content):
+        # 纯文本无需解析HTML
+        return content.strip(), []
+    return html_parser.extract(content)
+
+
+def _process_one(file_path: str, text: str, code_blocks: list, html_parser: 'HTMLParser', rewriter,
+                 output_dir: str, article_type: str, cached: Optional[str] = None, embedding=None) -> str:
+    """改写单个文件并保存（缓存命中时直接使用缓存结果），返回改写后的文本"""
+    rewritten = cached
+    if rewritten is None:
+        rewritten = rewriter.rewrite(text, article_type=article_type)
+        rewriter.store_cached(text, rewritten, article_type, embedding=embedding)
+    rewritten_html = html_parser.simple_restore(rewritten, code_blocks)
+    
+    # 保存
+    output_file = Path(output_dir) / Path(file_path).name
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(rewritten_html)
+    
+    return rewritten
+
+
 @click.group()
 @click.version_option(version='1.0.0', prog_name='SpinGenius')
 def cli():
@@ -89,8 +116,11 @@ def cli():
 @click.option('--check-similarity', is_flag=True, help='检查改写后的相似度')
 @click.option('--show-diff', is_flag=True, help='显示文本差异对比')
 @click.option('--preserve-html', is_flag=True, default=True, help='保留HTML结构')
+@click.option('-q', '--quiet', is_flag=True, help='不输出进度信息')
+@click.option('--no-cache', is_flag=True, help='不使用语义缓存（强制重新改写）')
 def rewrite(input_file: str, output_file: str, mode: str, article_type: str, 
-            provider: Optional[str], check_similarity: bool, show_diff: bool, preserve_html: bool):
+            provider: Optional[str], check_similarity: bool, show_diff: bool, preserve_html: bool,
+            quiet: bool, no_cache: bool):
     """
     改写文章
     
@@ -104,42 +134,59 @@ def rewrite(input_file: str, output_file: str, mode: str, article_type: str,
     # 保险文章（API模式）
     python cli.py rewrite input.html -o output.html --mode api --type insurance --provider openai
     """
+    from processors.html_parser import HTMLParser
+    
+    def status(color: str, message: str) -> None:
+        """输出进度信息（静默模式下跳过）"""
+        if not quiet:
+            print(colored(color, message))
+    
     try:
-        print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
-        print(f"{Fore.CYAN}SpinGenius - 文章改写工具{Style.RESET_ALL}")
-        print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
+        status(Fore.CYAN, '=' * 60)
+        status(Fore.CYAN, "SpinGenius - 文章改写工具")
+        status(Fore.CYAN, '=' * 60 + '\n')
         
         # 读取输入文件
-        print(f"{Fore.YELLOW}📖 读取文件: {input_file}{Style.RESET_ALL}")
+        status(Fore.YELLOW, f"📖 读取文件: {input_file}")
         with open(input_file, 'r', encoding='utf-8') as f:
             original_content = f.read()
         
-        # 解析HTML
-        print(f"{Fore.YELLOW}🔍 解析HTML内容...{Style.RESET_ALL}")
+        # 解析HTML（纯文本输入直接使用原文）
         html_parser = HTMLParser(preserve_code=True)
-        text_content = html_parser.extract_text(original_content)
+        is_html = html_parser.is_html(original_content)
+        if is_html:
+            status(Fore.YELLOW, "🔍 解析HTML内容...")
+            text_content = html_parser.extract_text(original_content)
+        else:
+            text_content = original_content.strip()
         
-        print(f"{Fore.GREEN}✓ 提取文本长度: {len(text_content)} 字符{Style.RESET_ALL}\n")
+        status(Fore.GREEN, f"✓ 提取文本长度: {len(text_content)} 字符\n")
         
         # 初始化改写器
         if mode == 'local':
-            print(f"{Fore.CYAN}🤖 使用本地模型改写{Style.RESET_ALL}")
+            from core.local_rewriter import LocalRewriter
+            status(Fore.CYAN, "🤖 使用本地模型改写")
             rewriter = LocalRewriter()
         else:
+            from core.api_rewriter import APIRewriter
             provider = provider or 'openai'
-            print(f"{Fore.CYAN}🌐 使用 {provider.upper()} API 改写{Style.RESET_ALL}")
+            status(Fore.CYAN, f"🌐 使用 {provider.upper()} API 改写")
             rewriter = APIRewriter(provider=provider)
+        if quiet:
+            rewriter.echo = None
+        if no_cache:
+            rewriter.cache.enabled = False
         
         # 执行改写
-        print(f"{Fore.YELLOW}✍️  开始改写 ({article_type} 类型)...{Style.RESET_ALL}")
-        rewritten_text = rewriter.rewrite(text_content, article_type=article_type)
+        status(Fore.YELLOW, f"✍️  开始改写 ({article_type} 类型)...")
+        rewritten_text = rewriter.rewrite_cached(text_content, article_type=article_type)
         
         # 还原HTML
-        if preserve_html and original_content.strip().startswith('<'):
-            print(f"{Fore.YELLOW}🔄 还原HTML结构...{Style.RESET_ALL}")
+        if preserve_html and is_html:
+            status(Fore.YELLOW, "🔄 还原HTML结构...")
             rewritten_html = html_parser.restore_html(original_content, rewritten_text)
         else:
-            print(f"{Fore.YELLOW}🔄 生成HTML格式...{Style.RESET_ALL}")
+            status(Fore.YELLOW, "🔄 生成HTML格式...")
             rewritten_html = html_parser.simple_restore(rewritten_text)
         
         # 保存结果
@@ -149,32 +196,34 @@ def rewrite(input_file: str, output_file: str, mode: str, article_type: str,
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write(rewritten_html)
         
-        print(f"{Fore.GREEN}✓ 改写完成，已保存到: {output_file}{Style.RESET_ALL}\n")
+        status(Fore.GREEN, f"✓ 改写完成，已保存到: {output_file}\n")
         
         # 相似度检测
         if check_similarity:
             if not SIMILARITY_AVAILABLE:
-                print(f"{Fore.YELLOW}⚠ 相似度检测功能未安装{Style.RESET_ALL}")
-                print(f"{Fore.YELLOW}  安装: pip install numpy sentence-transformers{Style.RESET_ALL}\n")
+                print(colored(Fore.YELLOW, "⚠ 相似度检测功能未安装"))
+                print(colored(Fore.YELLOW, "  安装: pip install numpy sentence-transformers\n"))
             else:
-                print(f"{Fore.YELLOW}📊 检测相似度...{Style.RESET_ALL}")
+                status(Fore.YELLOW, "📊 检测相似度...")
                 checker = SimilarityChecker()
+                if quiet:
+                    checker.echo = None
                 result = checker.check_quality(text_content, rewritten_text)
                 
                 status_color = Fore.GREEN if result['passed'] else Fore.RED
-                print(f"{status_color}相似度: {result['similarity']:.2%}{Style.RESET_ALL}")
-                print(f"{status_color}状态: {result['status']}{Style.RESET_ALL}")
-                print(f"{status_color}评价: {result['message']}{Style.RESET_ALL}\n")
+                print(colored(status_color, f"相似度: {result['similarity']:.2%}"))
+                print(colored(status_color, f"状态: {result['status']}"))
+                print(colored(status_color, f"评价: {result['message']}\n"))
         
         # 显示差异对比
         if show_diff:
             show_text_diff(text_content, rewritten_text)
         
-        print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
-        print(f"{Fore.GREEN}✨ 任务完成！{Style.RESET_ALL}")
+        status(Fore.CYAN, '=' * 60)
+        status(Fore.GREEN, "✨ 任务完成！")
         
     except Exception as e:
-        print(f"\n{Fore.RED}❌ 错误: {str(e)}{Style.RESET_ALL}")
+        print(colored(Fore.RED, f"\n❌ 错误: {str(e)}"))
         sys.exit(1)
 
 
@@ -192,11 +241,11 @@ def check(file1: str, file2: str):
     """
     try:
         if not SIMILARITY_AVAILABLE:
-            print(f"{Fore.RED}❌ 相似度检测功能未安装{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}安装: pip install numpy sentence-transformers{Style.RESET_ALL}")
+            print(colored(Fore.RED, "❌ 相似度检测功能未安装"))
+            print(colored(Fore.YELLOW, "安装: pip install numpy sentence-transformers"))
             sys.exit(1)
         
-        print(f"{Fore.CYAN}📊 相似度检测{Style.RESET_ALL}\n")
+        print(colored(Fore.CYAN, "📊 相似度检测\n"))
         
         # 读取文件
         with open(file1, 'r', encoding='utf-8') as f:
@@ -205,6 +254,7 @@ def check(file1: str, file2: str):
             content2 = f.read()
         
         # 提取文本
+        from processors.html_parser import HTMLParser
         parser = HTMLParser()
         text1 = parser.extract_text(content1)
         text2 = parser.extract_text(content2)
@@ -218,13 +268,13 @@ def check(file1: str, file2: str):
         print(f"文件2: {file2}\n")
         
         status_color = Fore.GREEN if result['passed'] else Fore.RED
-        print(f"{status_color}相似度: {result['similarity']:.2%}{Style.RESET_ALL}")
-        print(f"{status_color}阈值: {result['threshold']:.2%}{Style.RESET_ALL}")
-        print(f"{status_color}状态: {result['status']}{Style.RESET_ALL}")
-        print(f"{status_color}评价: {result['message']}{Style.RESET_ALL}")
+        print(colored(status_color, f"相似度: {result['similarity']:.2%}"))
+        print(colored(status_color, f"阈值: {result['threshold']:.2%}"))
+        print(colored(status_color, f"状态: {result['status']}"))
+        print(colored(status_color, f"评价: {result['message']}"))
         
     except Exception as e:
-        print(f"\n{Fore.RED}❌ 错误: {str(e)}{Style.RESET_ALL}")
+        print(colored(Fore.RED, f"\n❌ 错误: {str(e)}"))
         sys.exit(1)
 
 
@@ -236,7 +286,10 @@ def check(file1: str, file2: str):
               help='改写模式')
 @click.option('-t', '--type', 'article_type', type=click.Choice(['tech', 'insurance']),
               default='tech', help='文章类型')
-def batch(input_pattern: str, output_dir: str, mode: str, article_type: str):
+@click.option('--check-similarity', is_flag=True, help='检查改写后的相似度')
+@click.option('--no-cache', is_flag=True, help='不使用语义缓存（强制重新改写）')
+def batch(input_pattern: str, output_dir: str, mode: str, article_type: str, check_similarity: bool,
+          no_cache: bool):
     """
     批量处理文件
     
@@ -246,55 +299,118 @@ def batch(input_pattern: str, output_dir: str, mode: str, article_type: str):
     python cli.py batch "./articles/*.html" -o ./output/ --mode local --type tech
     """
     import glob
+    from concurrent.futures import ThreadPoolExecutor, as_completed
     from tqdm import tqdm
     
     try:
         # 查找文件
         files = glob.glob(input_pattern)
         if not files:
-            print(f"{Fore.RED}未找到匹配的文件: {input_pattern}{Style.RESET_ALL}")
+            print(colored(Fore.RED, f"未找到匹配的文件: {input_pattern}"))
             return
         
-        print(f"{Fore.CYAN}找到 {len(files)} 个文件{Style.RESET_ALL}\n")
+        print(colored(Fore.CYAN, f"找到 {len(files)} 个文件\n"))
         
         # 创建输出目录
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         
         # 初始化改写器
         if mode == 'local':
+            from core.local_rewriter import LocalRewriter
             rewriter = LocalRewriter()
         else:
+            from core.api_rewriter import APIRewriter
             rewriter = APIRewriter()
+        # 改写器的状态信息通过tqdm输出，避免打乱进度条
+        rewriter.echo = tqdm.write
+        rewriter.cache.echo = lambda message: tqdm.write(message, file=sys.stderr)
+        if no_cache:
+            rewriter.cache.enabled = False
+        
+        # 并发改写（API模式主要是网络等待；本地Ollama受限于单GPU，并发上限为2）
+        max_workers = rewriter.config.get('rewrite', {}).get('batch_concurrency', 16)
+        if mode == 'local':
+            max_workers = min(max_workers, 2)
         
+        # 解析器不保存单篇文档状态，所有线程共享同一实例
+        from processors.html_parser import HTMLParser
         html_parser = HTMLParser()
         
-        # 批量处理
         success_count = 0
-        for file_path in tqdm(files, desc="处理进度"):
-            try:
-                # 读取文件
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # 改写
-                text = html_parser.extract_text(content)
-                rewritten = rewriter.rewrite(text, article_type=article_type)
-                rewritten_html = html_parser.simple_restore(rewritten)
-                
-                # 保存
-                output_file = Path(output_dir) / Path(file_path).name
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(rewritten_html)
+        with ThreadPoolExecutor() as reader, ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            # 并行读取文件并提取文本
+            read_futures = {reader.submit(_extract_document, p, html_parser): p for p in files}
+            futures = {}
+            originals = {}
+            
+            def loaded_documents():
+                """按读取完成的顺序产出 (文件路径, 文本, 代码块)"""
+                for read_future in as_completed(read_futures):
+                    file_path = read_futures[read_future]
+                    try:
+                        text, code_blocks = read_future.result()
+                    except Exception as e:
+                        tqdm.write(colored(Fore.RED, f"处理失败 {file_path}: {str(e)}"))
+                        continue
+                    yield file_path, text, code_blocks
+            
+            if rewriter.cache.is_available():
+                # 启用缓存时先读完全部文件：一次批量生成embedding，一次矩阵乘法完成全部缓存查找
+                documents = list(loaded_documents())
+                if documents:
+                    embeddings = rewriter.cache.embed_batch([text for _, text, _ in documents])
+                    hits = rewriter.cache.lookup_batch(embeddings, article_type)
+                    for idx, (file_path, text, code_blocks) in enumerate(documents):
+                        originals[file_path] = text
+                        future = executor.submit(_process_one, file_path, text, code_blocks, html_parser,
+                                                 rewriter, output_dir, article_type, hits[idx], embeddings[idx])
+                        futures[future] = file_path
+            else:
+                # 未启用缓存时每个文件读完立即提交改写，读盘与模型调用相互重叠
+                for file_path, text, code_blocks in loaded_documents():
+                    originals[file_path] = text
+                    future = executor.submit(_process_one, file_path, text, code_blocks, html_parser,
+                                             rewriter, output_dir, article_type)
+                    futures[future] = file_path
+            
+            rewritten_texts = {}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="处理进度"):
+                try:
+                    rewritten_texts[futures[future]] = future.result()
+                    success_count += 1
+                except Exception as e:
+                    tqdm.write(colored(Fore.RED, f"处理失败 {futures[future]}: {str(e)}"))
+        
+        # 所有文件处理完后一次性保存缓存
+        rewriter.cache.flush()
+        
+        print(colored(Fore.GREEN, f"\n✓ 完成! 成功处理 {success_count}/{len(files)} 个文件"))
+        
+        # 相似度检测：所有文件一次批量编码
+        if check_similarity and rewritten_texts:
+            if not SIMILARITY_AVAILABLE:
+                print(colored(Fore.YELLOW, "⚠ 相似度检测功能未安装"))
+                print(colored(Fore.YELLOW, "  安装: pip install numpy sentence-transformers"))
+            else:
+                print(colored(Fore.YELLOW, "\n📊 检测相似度..."))
+                checked = [p for p in files if p in rewritten_texts]
+                checker = SimilarityChecker()
+                checker.echo = tqdm.write
+                results = checker.check_quality(
+                    [originals[p] for p in checked],
+                    [rewritten_texts[p] for p in checked],
+                )
                 
-                success_count += 1
+                passed_count = 0
+                for file_path, result in zip(checked, results):
+                    passed_count += result['passed']
+                    status_color = Fore.GREEN if result['passed'] else Fore.RED
+                    print(colored(status_color, f"{file_path}: 相似度 {result['similarity']:.2%} {result['status']}"))
                 
-            except Exception as e:
-                print(f"\n{Fore.RED}处理失败 {file_path}: {str(e)}{Style.RESET_ALL}")
-        
-        print(f"\n{Fore.GREEN}✓ 完成! 成功处理 {success_count}/{len(files)} 个文件{Style.RESET_ALL}")
+                print(colored(Fore.GREEN, f"✓ 相似度合格 {passed_count}/{len(checked)} 个文件"))
         
     except Exception as e:
-        print(f"\n{Fore.RED}❌ 错误: {str(e)}{Style.RESET_ALL}")
+        print(colored(Fore.RED, f"\n❌ 错误: {str(e)}"))
         sys.exit(1)
 
 
@@ -302,31 +418,32 @@ def batch(input_pattern: str, output_dir: str, mode: str, article_type: str):
 def info():
     """显示系统信息和配置"""
     try:
-        print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
-        print(f"{Fore.CYAN}SpinGenius 系统信息{Style.RESET_ALL}")
-        print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
+        print(colored(Fore.CYAN, '=' * 60))
+        print(colored(Fore.CYAN, "SpinGenius 系统信息"))
+        print(colored(Fore.CYAN, '=' * 60 + '\n'))
         
         # 检查Ollama
-        print(f"{Fore.YELLOW}本地模型 (Ollama):{Style.RESET_ALL}")
+        print(colored(Fore.YELLOW, "本地模型 (Ollama):"))
         try:
+            from core.local_rewriter import LocalRewriter
             rewriter = LocalRewriter()
             if rewriter.is_available():
-                print(f"  {Fore.GREEN}✓ Ollama服务运行中{Style.RESET_ALL}")
+                print(colored(Fore.GREEN, "  ✓ Ollama服务运行中"))
                 if rewriter.check_model_exists():
-                    print(f"  {Fore.GREEN}✓ 模型 {rewriter.model} 已安装{Style.RESET_ALL}")
+                    print(colored(Fore.GREEN, f"  ✓ 模型 {rewriter.model} 已安装"))
                 else:
-                    print(f"  {Fore.RED}✗ 模型 {rewriter.model} 未安装{Style.RESET_ALL}")
+                    print(colored(Fore.RED, f"  ✗ 模型 {rewriter.model} 未安装"))
                     print(f"    运行: ollama pull {rewriter.model}")
             else:
-                print(f"  {Fore.RED}✗ Ollama服务未运行{Style.RESET_ALL}")
+                print(colored(Fore.RED, "  ✗ Ollama服务未运行"))
                 print(f"    运行: ollama serve")
         except Exception as e:
-            print(f"  {Fore.RED}✗ 错误: {str(e)}{Style.RESET_ALL}")
+            print(colored(Fore.RED, f"  ✗ 错误: {str(e)}"))
         
         print()
         
         # 检查API配置
-        print(f"{Fore.YELLOW}API配置:{Style.RESET_ALL}")
+        print(colored(Fore.YELLOW, "API配置:"))
         from dotenv import load_dotenv
         load_dotenv()
         
@@ -338,14 +455,14 @@ def info():
         
         for name, key in api_keys.items():
             if key and not key.startswith('${'):
-                print(f"  {Fore.GREEN}✓ {name} API Key 已配置{Style.RESET_ALL}")
+                print(colored(Fore.GREEN, f"  ✓ {name} API Key 已配置"))
             else:
-                print(f"  {Fore.YELLOW}○ {name} API Key 未配置{Style.RESET_ALL}")
+                print(colored(Fore.YELLOW, f"  ○ {name} API Key 未配置"))
         
-        print(f"\n{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
+        print(colored(Fore.CYAN, '\n' + '=' * 60))
         
     except Exception as e:
-        print(f"\n{Fore.RED}❌ 错误: {str(e)}{Style.RESET_ALL}")
+        print(colored(Fore.RED, f"\n❌ 错误: {str(e)}"))
 
 
 if __name__ == '__main__':
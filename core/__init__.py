@@ -3,8 +3,22 @@ SpinGenius Core Module
 核心改写引擎
 """
 
+import importlib
+
 from .rewriter import BaseRewriter
-from .local_rewriter import LocalRewriter
-from .api_rewriter import APIRewriter
+from .semantic_cache import SemanticCache
+
+# 具体改写器按需导入，避免导入包时加载requests等依赖
+_LAZY_IMPORTS = {
+    'LocalRewriter': '.local_rewriter',
+    'APIRewriter': '.api_rewriter',
+}
+
+__all__ = ['BaseRewriter', 'LocalRewriter', 'APIRewriter', 'SemanticCache']
+
 
-__all__ = ['BaseRewriter', 'LocalRewriter', 'APIRewriter']
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -100,10 +100,9 @@ class APIRewriter(BaseRewriter):
             raise RuntimeError(f"API客户端未初始化: {self.provider}")
         
         # 加载提示词
-        prompt_template = self.load_prompt(article_type)
-        prompt = prompt_template.format(content=content)
+        prompt = self.build_prompt(content, article_type)
         
-        print(f"{Fore.CYAN}正在使用 {self.provider.upper()} API 改写...{Style.RESET_ALL}")
+        self._echo(f"{Fore.CYAN}正在使用 {self.provider.upper()} API 改写...{Style.RESET_ALL}")
         
         try:
             if self.provider == 'claude':
@@ -130,7 +129,7 @@ class APIRewriter(BaseRewriter):
         if not rewritten_content:
             raise RuntimeError("API返回空内容")
         
-        print(f"{Fore.GREEN}✓ 改写完成{Style.RESET_ALL}")
+        self._echo(f"{Fore.GREEN}✓ 改写完成{Style.RESET_ALL}")
         return rewritten_content
     
     def _rewrite_with_claude(self, prompt: str) -> str:
@@ -149,5 +148,5 @@ class APIRewriter(BaseRewriter):
         if not rewritten_content:
             raise RuntimeError("API返回空内容")
         
-        print(f"{Fore.GREEN}✓ 改写完成{Style.RESET_ALL}")
+        self._echo(f"{Fore.GREEN}✓ 改写完成{Style.RESET_ALL}")
         return rewritten_content
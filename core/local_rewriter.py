@@ -3,11 +3,37 @@
 使用Ollama进行本地改写
 """
 
+import json
+import re
 import requests
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, List, Optional, Tuple
 from .rewriter import BaseRewriter
 from colorama import Fore, Style
 
+# 优先使用orjson进行JSON序列化（未安装时回退到标准库）
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    _loads = json.loads
+
+# deepseek-r1 模型输出中的思考过程
+_THINK_RE = re.compile(r'<think>.*?</think>', re.DOTALL)
+
+# 以句末标点（可带右引号/括号）结尾的行
+_SENTENCE_END_RE = re.compile(r'[。！？!?；;…\.][”’"』」）)]*\s*$')
+
+
+def _count_fences(text: str) -> int:
+    """统计文本中 ``` 代码围栏行的数量"""
+    return sum(1 for line in text.split('\n') if line.lstrip().startswith('```'))
+
 
 class LocalRewriter(BaseRewriter):
     """本地模型改写器（基于Ollama）"""
@@ -19,25 +45,55 @@ class LocalRewriter(BaseRewriter):
         self.base_url = self.local_config.get('base_url', 'http://localhost:11434')
         self.temperature = self.local_config.get('temperature', 0.7)
         self.max_tokens = self.local_config.get('max_tokens', 4000)
+        self.chunk_tokens = self.local_config.get('chunk_tokens', 0)
+        self.chunk_workers = self.local_config.get('chunk_workers', 4)
+        self._strip_think = 'deepseek-r1' in self.model.lower()
+        
+        # 请求体中不变的部分只序列化一次，每次请求只需序列化prompt
+        self._payload_head = _dumps({
+            "model": self.model,
+            "stream": True,
+            "options": {
+                "temperature": self.temperature,
+                "num_predict": self.max_tokens,
+            }
+        })[:-1] + b',"prompt":'
+        
+        # 复用连接，避免每次请求重新建立TCP连接
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3),
+        ))
+        # 健康检查不重试：服务未启动时应立即返回
+        self.session.mount(f"{self.base_url.rstrip('/')}/api/tags", HTTPAdapter(max_retries=0))
+        self._model_exists = None
         
     def is_available(self) -> bool:
         """检查Ollama服务是否可用"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
             return response.status_code == 200
         except Exception:
             return False
     
     def check_model_exists(self) -> bool:
-        """检查模型是否已下载"""
+        """检查模型是否已下载（结果在整个运行期间缓存）"""
+        if self._model_exists is None:
+            self._model_exists = self._query_model_exists()
+        return bool(self._model_exists)
+    
+    def _query_model_exists(self) -> Optional[bool]:
+        """向Ollama查询模型列表，服务不可达时返回None（不缓存）"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 models = response.json().get('models', [])
                 return any(model['name'] == self.model for model in models)
             return False
         except Exception:
-            return False
+            return None
     
     def rewrite(self, content: str, article_type: str = 'tech', **kwargs) -> str:
         """
@@ -51,8 +107,8 @@ class LocalRewriter(BaseRewriter):
         Returns:
             改写后的内容
         """
-        # 检查服务可用性
-        if not self.is_available():
+        # 检查服务可用性（模型已确认存在时说明服务已检查过）
+        if self._model_exists is None and not self.is_available():
             raise RuntimeError(
                 f"{Fore.RED}Ollama服务不可用！{Style.RESET_ALL}\n"
                 f"请确保Ollama已启动: ollama serve"
@@ -65,48 +121,179 @@ class LocalRewriter(BaseRewriter):
                 f"请先下载模型: ollama pull {self.model}"
             )
         
-        # 加载提示词
-        prompt_template = self.load_prompt(article_type)
-        prompt = prompt_template.format(content=content)
-        
         # 调用Ollama API
-        print(f"{Fore.CYAN}正在使用本地模型 {self.model} 改写...{Style.RESET_ALL}")
+        self._echo(f"{Fore.CYAN}正在使用本地模型 {self.model} 改写...{Style.RESET_ALL}")
         
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": self.temperature,
-                        "num_predict": self.max_tokens,
-                    }
-                },
-                timeout=300  # 5分钟超时
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                rewritten_content = result.get('response', '').strip()
-                
-                if not rewritten_content:
-                    raise RuntimeError("模型返回空内容")
-                
-                # 处理 deepseek-r1 模型的思考过程标签
-                if 'deepseek-r1' in self.model.lower():
-                    # 移除 <think>...</think> 标签及其内容
-                    import re
-                    rewritten_content = re.sub(r'<think>.*?</think>', '', rewritten_content, flags=re.DOTALL)
-                    rewritten_content = rewritten_content.strip()
-                
-                print(f"{Fore.GREEN}✓ 改写完成{Style.RESET_ALL}")
-                return rewritten_content
+            # 长文按段落切分后并发改写，再按原顺序拼接
+            chunks = self._split_for_rewrite(content, self.chunk_tokens)
+            if not chunks:
+                raise RuntimeError("待改写内容为空")
+            if len(chunks) == 1:
+                rewritten_content = self._rewrite_one(content, article_type)
             else:
-                raise RuntimeError(f"API调用失败: {response.status_code} - {response.text}")
+                workers = max(1, min(self.chunk_workers, len(chunks)))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = executor.map(lambda chunk: self._rewrite_one(chunk[0], article_type), chunks)
+                    # 按切分时的分隔符拼接，段内切开的片段仍属于同一段落
+                    rewritten_content = ''.join(
+                        sep + result for (_, sep), result in zip(chunks, results)
+                    )
+            
+            self._echo(f"{Fore.GREEN}✓ 改写完成{Style.RESET_ALL}")
+            return rewritten_content
                 
         except requests.exceptions.Timeout:
             raise RuntimeError("请求超时，文章可能过长，请尝试分段处理")
         except Exception as e:
             raise RuntimeError(f"改写失败: {str(e)}")
+    
+    def _rewrite_one(self, content: str, article_type: str) -> str:
+        """调用Ollama改写一段内容"""
+        prompt = self.build_prompt(content, article_type)
+        
+        with self.session.post(
+            f"{self.base_url}/api/generate",
+            data=self._payload_head + _dumps(prompt) + b'}',
+            headers={'Content-Type': 'application/json'},
+            timeout=300,  # 5分钟超时
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"API调用失败: {response.status_code} - {response.text}")
+            
+            rewritten_content = self._read_stream(response).strip()
+        
+        # 处理 deepseek-r1 模型的思考过程标签
+        if self._strip_think:
+            # 移除 <think>...</think> 标签及其内容
+            rewritten_content = _THINK_RE.sub('', rewritten_content).strip()
+        
+        if not rewritten_content:
+            raise RuntimeError("模型返回空内容")
+        
+        return rewritten_content
+    
+    def _split_for_rewrite(self, text: str, max_tokens: int = 0) -> List[Tuple[str, str]]:
+        """
+        将长文切分为可独立改写的片段
+        
+        按空行切分段落；``` 代码块（无论是否位于段首）作为不可分割的整体；
+        超长段落优先在句末（。！？等结尾的行）切分，单句仍超长时才按行切分。
+        段内各行仍以单个换行连接。token数按字符数近似估计，分隔符也计入长度。
+        不会产生空白片段。
+        
+        Args:
+            text: 待改写文本
+            max_tokens: 每个片段的最大长度，0表示不切分
+            
+        Returns:
+            (片段, 与前一片段之间的原分隔符) 列表，首个片段的分隔符为空串；
+            按顺序用分隔符拼接即还原原文结构。文本为空白时返回空列表
+        """
+        if not text.strip():
+            return []
+        if max_tokens <= 0 or len(text) <= max_tokens:
+            return [(text, '')]
+        
+        # 按空行切分段落，每个段落由若干元素组成：普通行，或整个代码块（含其中的空行）
+        paragraphs = []
+        current = []
+        fence = None
+        for line in text.split('\n'):
+            is_fence_line = line.lstrip().startswith('```')
+            if fence is not None:
+                fence.append(line)
+                if is_fence_line:
+                    current.append(('\n'.join(fence), True))
+                    fence = None
+                continue
+            if is_fence_line:
+                fence = [line]
+                continue
+            if not line.strip():
+                if current:
+                    paragraphs.append(current)
+                    current = []
+                continue
+            current.append((line, False))
+        if fence is not None:
+            # 未闭合的代码块直到文末
+            current.append(('\n'.join(fence), True))
+        if current:
+            paragraphs.append(current)
+        
+        # 切分单元 (文本, 与前一单元之间的分隔符)
+        units = []
+        for items in paragraphs:
+            para = '\n'.join(item for item, _ in items)
+            if len(para) <= max_tokens:
+                units.append((para, '\n\n'))
+                continue
+            
+            # 超长段落：把行合并为完整的句子，代码块单独成组
+            groups = []
+            sentence = []
+            for item, is_code in items:
+                if is_code:
+                    if sentence:
+                        groups.append(sentence)
+                        sentence = []
+                    groups.append([item])
+                    continue
+                sentence.append(item)
+                if _SENTENCE_END_RE.search(item):
+                    groups.append(sentence)
+                    sentence = []
+            if sentence:
+                groups.append(sentence)
+            
+            sep = '\n\n'
+            for group in groups:
+                joined = '\n'.join(group)
+                # 单句仍超长时退回按行切分（代码块本身只有一个元素，不会被拆开）
+                pieces = group if len(joined) > max_tokens else [joined]
+                for piece in pieces:
+                    units.append((piece, sep))
+                    sep = '\n'
+        
+        # 合并为不超过上限的片段
+        chunks = []
+        buffer = []
+        size = 0
+        chunk_sep = ''
+        for unit, sep in units:
+            if buffer and size + len(sep) + len(unit) > max_tokens:
+                chunks.append((''.join(buffer), chunk_sep))
+                buffer = []
+                size = 0
+            if buffer:
+                buffer.append(sep)
+                size += len(sep)
+            elif chunks:
+                # 记录片段边界处原本的分隔符（段落间为空行，段内为单个换行）
+                chunk_sep = sep
+            buffer.append(unit)
+            size += len(unit)
+        if buffer:
+            chunks.append((''.join(buffer), chunk_sep))
+        
+        # 兜底检查：任何片段中的代码围栏都必须成对，否则放弃切分
+        if any(_count_fences(chunk) % 2 for chunk, _ in chunks[:-1]):
+            return [(text, '')]
+        
+        return chunks
+    
+    def _read_stream(self, response) -> str:
+        """逐行读取Ollama的NDJSON流式响应并拼接生成内容"""
+        parts = []
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = _loads(line)
+            if chunk.get('error'):
+                raise RuntimeError(chunk['error'])
+            parts.append(chunk.get('response', ''))
+            if chunk.get('done'):
+                break
+        return ''.join(parts)
@@ -4,9 +4,52 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional, Tuple
+import copy
+import functools
 import yaml
 import os
+import re
+from colorama import Fore, Style
+from dotenv import load_dotenv
+from .semantic_cache import SemanticCache
+
+# 优先使用libyaml的C实现
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+load_dotenv()
+
+# 已解析的配置，按 (绝对路径, 修改时间) 缓存
+_CONFIG_CACHE: Dict[Tuple[str, float], Dict[str, Any]] = {}
+
+# 配置中的环境变量引用 ${VAR}
+_ENV_RE = re.compile(r'\$\{([^}]+)\}')
+
+
+def _env_replace(match: re.Match) -> str:
+    """替换为环境变量的值，未设置时保留原样"""
+    return os.getenv(match.group(1), match.group(0))
+
+
+def _substitute_env(obj: Any) -> Any:
+    """递归替换解析后配置中字符串值里的环境变量引用"""
+    if isinstance(obj, dict):
+        return {key: _substitute_env(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_substitute_env(item) for item in obj]
+    if isinstance(obj, str) and '${' in obj:
+        return _ENV_RE.sub(_env_replace, obj)
+    return obj
+
+
+@functools.lru_cache(maxsize=8)
+def _read_prompt(path: str) -> str:
+    """读取提示词文件（同一文件只读取一次）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
 
 
 class BaseRewriter(ABC):
@@ -21,36 +64,45 @@ class BaseRewriter(ABC):
         """
         self.config = self._load_config(config_path)
         self.protected_terms = self.config.get('protected_terms', {})
+        # 按文章类型缓存切分好的提示词模板 (前缀, 后缀)
+        self._prompt_parts: Dict[str, Tuple[str, str]] = {}
+        # 状态信息输出函数，为None时不输出
+        self.echo: Optional[Callable[[str], None]] = print
+        
+        cache_config = self.config.get('cache', {})
+        self.cache = SemanticCache(
+            cache_path=cache_config.get('path', '.cache/semantic_cache.pkl'),
+            model_name=cache_config.get('model', 'paraphrase-multilingual-MiniLM-L12-v2'),
+            threshold=cache_config.get('threshold', 0.92),
+            cluster_threshold=cache_config.get('cluster_threshold', 0.86),
+            enabled=cache_config.get('enabled', False),
+        )
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """加载配置文件"""
         if not os.path.exists(config_path):
             raise FileNotFoundError(f"配置文件不存在: {config_path}")
+        
+        cache_key = (os.path.abspath(config_path), os.path.getmtime(config_path))
+        cached = _CONFIG_CACHE.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
             
         with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        
-        # 处理环境变量
-        self._process_env_vars(config)
-        return config
-    
-    def _process_env_vars(self, config: Dict[str, Any]) -> None:
-        """处理配置中的环境变量"""
-        from dotenv import load_dotenv
-        load_dotenv()
+            raw = f.read()
         
-        def replace_env_vars(obj):
-            if isinstance(obj, dict):
-                return {k: replace_env_vars(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [replace_env_vars(item) for item in obj]
-            elif isinstance(obj, str) and obj.startswith('${') and obj.endswith('}'):
-                env_var = obj[2:-1]
-                return os.getenv(env_var, obj)
-            return obj
+        config = yaml.load(raw, Loader=SafeLoader)
         
-        for key in config:
-            config[key] = replace_env_vars(config[key])
+        # 处理环境变量：只替换解析后的字符串值，环境变量的内容不会被当作YAML解析
+        if '${' in raw:
+            config = _substitute_env(config)
+        _CONFIG_CACHE[cache_key] = config
+        return copy.deepcopy(config)
+    
+    def _echo(self, message: str) -> None:
+        """输出状态信息"""
+        if self.echo is not None:
+            self.echo(message)
     
     def load_prompt(self, article_type: str) -> str:
         """
@@ -63,11 +115,37 @@ class BaseRewriter(ABC):
             提示词模板内容
         """
         prompt_file = f"prompts/{article_type}_blog.txt"
-        if not os.path.exists(prompt_file):
+        try:
+            return _read_prompt(prompt_file)
+        except FileNotFoundError:
             raise FileNotFoundError(f"提示词文件不存在: {prompt_file}")
+    
+    def build_prompt(self, content: str, article_type: str = 'tech') -> str:
+        """
+        用提示词模板生成完整提示词
+        
+        模板只有 {content} 一个占位符，首次使用时切分为前后两段，之后直接拼接
+        
+        Args:
+            content: 原始文章内容
+            article_type: 文章类型 (tech/insurance)
             
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            return f.read()
+        Returns:
+            完整提示词
+        """
+        parts = self._prompt_parts.get(article_type)
+        if parts is None:
+            template = self.load_prompt(article_type)
+            idx = template.find('{content}')
+            if idx < 0:
+                raise ValueError(f"提示词模板缺少{{content}}占位符: {article_type}")
+            # 与 str.format 保持一致，还原转义的花括号
+            prefix, suffix = (
+                part.replace('{{', '{').replace('}}', '}')
+                for part in (template[:idx], template[idx + len('{content}'):])
+            )
+            parts = self._prompt_parts[article_type] = (prefix, suffix)
+        return parts[0] + content + parts[1]
     
     def get_protected_terms(self, article_type: str) -> list:
         """
@@ -81,6 +159,42 @@ class BaseRewriter(ABC):
         """
         return self.protected_terms.get(article_type, [])
     
+    def rewrite_cached(self, content: str, article_type: str = 'tech', **kwargs) -> str:
+        """
+        改写文章内容，优先复用语义缓存中的结果
+        
+        Args:
+            content: 原始文章内容
+            article_type: 文章类型 (tech/insurance)
+            **kwargs: 其他参数
+            
+        Returns:
+            改写后的内容
+        """
+        embedding = self.cache.embed(content)
+        hit = self.cache.lookup(content, article_type, embedding=embedding)
+        if hit is not None:
+            self._echo(f"{Fore.GREEN}✓ 命中语义缓存，跳过模型调用{Style.RESET_ALL}")
+            return hit
+        
+        result = self.rewrite(content, article_type=article_type, **kwargs)
+        self.store_cached(content, result, article_type, embedding=embedding)
+        self.cache.flush()
+        return result
+    
+    def store_cached(self, content: str, result: str, article_type: str = 'tech', embedding=None) -> None:
+        """
+        将改写结果写入语义缓存（与原文相似度过高、质量不合格的结果不写入）
+        
+        Args:
+            content: 原始文章内容
+            result: 改写结果
+            article_type: 文章类型 (tech/insurance)
+            embedding: 原文的embedding（可选）
+        """
+        threshold = self.config.get('rewrite', {}).get('similarity_threshold', 0.3)
+        self.cache.put(content, result, article_type, embedding=embedding, max_similarity=threshold)
+    
     @abstractmethod
     def rewrite(self, content: str, article_type: str = 'tech', **kwargs) -> str:
         """
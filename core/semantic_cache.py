@@ -0,0 +1,313 @@
+"""
+语义缓存
+基于本地embedding缓存改写结果，相近的输入直接复用已有改写
+"""
+
+import os
+import pickle
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from colorama import Fore, Style
+
+# 缓存文件格式版本，格式变化时旧缓存自动失效
+CACHE_VERSION = 4
+
+
+def _print_warning(message: str) -> None:
+    """警告输出到stderr，不受静默模式影响"""
+    print(message, file=sys.stderr)
+
+
+class SemanticCache:
+    """改写结果的语义缓存（按簇中心索引）"""
+
+    def __init__(self, cache_path: str = ".cache/semantic_cache.pkl",
+                 model_name: str = 'paraphrase-multilingual-MiniLM-L12-v2',
+                 threshold: float = 0.92, cluster_threshold: float = 0.86,
+                 probes: int = 4, enabled: bool = False,
+                 echo: Optional[Callable[[str], None]] = _print_warning):
+        """
+        初始化语义缓存
+
+        Args:
+            cache_path: 缓存文件路径
+            model_name: embedding模型名称
+            threshold: 命中阈值（余弦相似度，越高越严格）
+            cluster_threshold: 聚类阈值，新向量与已有簇中心相似度不低于此值时加入该簇
+            probes: 查找时逐个比较成员的簇数（按簇中心相似度取前几个）
+            enabled: 是否启用缓存
+            echo: 警告信息输出函数，默认输出到stderr
+        """
+        self.cache_path = cache_path
+        self.model_name = model_name
+        self.threshold = threshold
+        self.cluster_threshold = cluster_threshold
+        self.probes = probes
+        self.enabled = enabled
+        self.model = None
+        # 按文章类型分别存储簇：
+        #   centroids: (K, d) float32 簇中心矩阵
+        #   norms: (K,) 簇中心的模长
+        #   members: 每个簇的成员，{'embeddings': (m, d) 向量矩阵, 'responses': 对应的改写结果}
+        # 簇中心只用于缩小查找范围，命中与否按成员自身的向量判断，不会返回其他文章的改写
+        self.clusters: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # 有未写入磁盘的修改，由 flush 统一保存
+        self._dirty = False
+        self.echo = echo
+
+    def _warn(self, message: str) -> None:
+        """输出警告信息"""
+        if self.echo is not None:
+            self.echo(f"{Fore.YELLOW}{message}{Style.RESET_ALL}")
+
+    def _load_model(self) -> bool:
+        """延迟加载embedding模型，依赖缺失时自动停用缓存"""
+        if not self.enabled:
+            return False
+        if self.model is None:
+            try:
+                import numpy  # noqa: F401
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                self._warn("⚠ 语义缓存需要sentence-transformers，已停用缓存")
+                self.enabled = False
+                return False
+            try:
+                self.model = SentenceTransformer(self.model_name)
+            except Exception as e:
+                # 离线或模型未下载等情况，缓存不可用不影响改写本身
+                self._warn(f"⚠ 语义缓存模型加载失败，已停用缓存: {e}")
+                self.enabled = False
+                return False
+            self._load()
+        return True
+
+    def _load(self) -> None:
+        """从磁盘加载缓存"""
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception:
+            self._warn(f"⚠ 缓存文件损坏，已忽略: {self.cache_path}")
+            return
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+            return
+        # 换用其他embedding模型后旧向量无法比较，丢弃旧缓存
+        if data.get('model') != self.model_name or data.get('dim') != self._dimension():
+            self._warn(f"⚠ 缓存由其他embedding模型生成，已忽略: {self.cache_path}")
+            return
+        self.clusters = data['clusters']
+
+    def _dimension(self) -> Optional[int]:
+        """当前模型的embedding维度"""
+        dim = self.model.get_sentence_embedding_dimension()
+        if dim is None:
+            dim = len(self.model.encode([''], normalize_embeddings=True)[0])
+        return int(dim)
+
+    def _save(self) -> None:
+        """将缓存写入磁盘（先写临时文件再替换，避免写坏）"""
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': CACHE_VERSION, 'model': self.model_name,
+                         'dim': self._dimension(), 'clusters': self.clusters},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.cache_path)
+
+    def flush(self) -> None:
+        """将未保存的修改写入磁盘（put 只修改内存，需在处理结束后调用）"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+                self._dirty = False
+
+    def is_available(self) -> bool:
+        """
+        检查缓存是否可用（首次调用时加载模型）
+
+        Returns:
+            是否可用
+        """
+        return self._load_model()
+
+    def embed(self, text: str):
+        """
+        生成归一化的embedding
+
+        Args:
+            text: 文本内容
+
+        Returns:
+            归一化向量，缓存不可用时返回None
+        """
+        if not self._load_model():
+            return None
+        return self.model.encode([text], normalize_embeddings=True)[0]
+
+    def embed_batch(self, texts: List[str], batch_size: int = 64):
+        """
+        一次性为多段文本生成归一化的embedding
+
+        Args:
+            texts: 文本列表
+            batch_size: 编码批大小
+
+        Returns:
+            (N, d) 向量矩阵，缓存不可用时返回None
+        """
+        if not texts or not self._load_model():
+            return None
+        return self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+
+    def _scores(self, clusters: Dict[str, Any], embedding):
+        """计算向量与所有簇中心的余弦相似度"""
+        import numpy as np
+        query = np.asarray(embedding, dtype=np.float32)
+        return (clusters['centroids'] @ query) / clusters['norms']
+
+    def _match(self, clusters: Dict[str, Any], query, scores, limit: float) -> Optional[str]:
+        """在簇中心最接近的几个簇内逐个比较成员，返回不低于命中阈值的最相近成员的改写"""
+        import numpy as np
+        if len(scores) > self.probes:
+            candidates = np.argpartition(scores, -self.probes)[-self.probes:]
+        else:
+            candidates = range(len(scores))
+
+        best_score, best_response = limit, None
+        for k in candidates:
+            member = clusters['members'][k]
+            # 成员向量均已归一化，点积即余弦相似度
+            member_scores = member['embeddings'] @ query
+            i = int(np.argmax(member_scores))
+            if member_scores[i] >= best_score:
+                best_score, best_response = member_scores[i], member['responses'][i]
+        return best_response
+
+    def lookup(self, content: str, article_type: str = 'tech',
+               threshold: Optional[float] = None, embedding=None) -> Optional[str]:
+        """
+        查找语义相近的已缓存改写
+
+        Args:
+            content: 原始文章内容
+            article_type: 文章类型 (tech/insurance)
+            threshold: 命中阈值，默认使用初始化时的阈值
+            embedding: 预先计算好的embedding（可选）
+
+        Returns:
+            命中时返回缓存的改写结果，否则返回None
+        """
+        if embedding is None:
+            embedding = self.embed(content)
+        if embedding is None:
+            return None
+
+        clusters = self.clusters.get(article_type)
+        if not clusters:
+            return None
+
+        import numpy as np
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = self._scores(clusters, query)
+        return self._match(clusters, query, scores, self.threshold if threshold is None else threshold)
+
+    def lookup_batch(self, embeddings, article_type: str = 'tech',
+                     threshold: Optional[float] = None) -> List[Optional[str]]:
+        """
+        批量查找缓存，一次矩阵乘法得到所有输入与簇中心的相似度
+
+        Args:
+            embeddings: (N, d) 向量矩阵，通常来自embed_batch
+            article_type: 文章类型 (tech/insurance)
+            threshold: 命中阈值，默认使用初始化时的阈值
+
+        Returns:
+            与输入一一对应的列表，命中为缓存的改写结果，否则为None
+        """
+        clusters = self.clusters.get(article_type)
+        if not clusters:
+            return [None] * len(embeddings)
+
+        import numpy as np
+        queries = np.asarray(embeddings, dtype=np.float32)
+        scores = (queries @ clusters['centroids'].T) / clusters['norms']
+        limit = self.threshold if threshold is None else threshold
+
+        return [self._match(clusters, queries[i], scores[i], limit) for i in range(len(queries))]
+
+    def put(self, content: str, response: str, article_type: str = 'tech', embedding=None,
+            max_similarity: Optional[float] = None) -> None:
+        """
+        写入缓存：与已有簇中心足够接近时加入该簇，否则新建簇（只修改内存，调用 flush 后写入磁盘）
+
+        Args:
+            content: 原始文章内容
+            response: 改写结果
+            article_type: 文章类型 (tech/insurance)
+            embedding: 预先计算好的embedding（可选）
+            max_similarity: 改写结果与原文的相似度不低于此值时视为改写不合格，不写入缓存
+        """
+        if embedding is None:
+            embedding = self.embed(content)
+        if embedding is None:
+            return
+
+        if max_similarity is not None:
+            import numpy as np
+            # 向量均已归一化，点积即余弦相似度
+            if float(np.dot(embedding, self.embed(response))) >= max_similarity:
+                return
+
+        with self._lock:
+            self._put(embedding, response, article_type)
+
+    def _put(self, embedding, response: str, article_type: str) -> None:
+        """写入缓存（调用方需持有锁）"""
+        import numpy as np
+        vector = np.asarray(embedding, dtype=np.float32)
+        clusters = self.clusters.get(article_type)
+
+        if clusters:
+            scores = self._scores(clusters, vector)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.cluster_threshold:
+                # 加入已有簇并增量更新簇中心，成员保留各自的向量和改写
+                member = clusters['members'][best]
+                n = len(member['responses'])
+                centroid = (clusters['centroids'][best] * n + vector) / (n + 1)
+                clusters['centroids'][best] = centroid
+                clusters['norms'][best] = np.linalg.norm(centroid)
+                # 整体替换成员，避免并发查找时读到长度不一致的向量和改写
+                clusters['members'][best] = {
+                    'embeddings': np.vstack([member['embeddings'], vector]),
+                    'responses': member['responses'] + [response],
+                }
+                self._dirty = True
+                return
+
+            # 整体替换，避免并发查找时读到形状不一致的数组
+            self.clusters[article_type] = {
+                'centroids': np.ascontiguousarray(np.vstack([clusters['centroids'], vector])),
+                'norms': np.append(clusters['norms'], np.float32(np.linalg.norm(vector))),
+                'members': clusters['members'] + [self._new_member(vector, response)],
+            }
+        else:
+            self.clusters[article_type] = {
+                'centroids': vector.reshape(1, -1).copy(),
+                'norms': np.array([np.linalg.norm(vector)], dtype=np.float32),
+                'members': [self._new_member(vector, response)],
+            }
+
+        self._dirty = True
+
+    @staticmethod
+    def _new_member(vector, response: str) -> Dict[str, Any]:
+        """单个向量组成的簇成员"""
+        return {'embeddings': vector.reshape(1, -1).copy(), 'responses': [response]}
@@ -3,12 +3,25 @@ SpinGenius Processors Module
 处理器模块
 """
 
-from .html_parser import HTMLParser
-from .term_protector import TermProtector
+import importlib
+
+# 各处理器按需导入，避免导入包时加载BeautifulSoup等依赖
+_LAZY_IMPORTS = {
+    'HTMLParser': '.html_parser',
+    'TermProtector': '.term_protector',
+    'unified_diff': '.text_diff',
+}
 
 # 相似度检测器是可选的
 try:
     from .similarity import SimilarityChecker
-    __all__ = ['HTMLParser', 'SimilarityChecker', 'TermProtector']
+    __all__ = ['HTMLParser', 'SimilarityChecker', 'TermProtector', 'unified_diff']
 except ImportError:
-    __all__ = ['HTMLParser', 'TermProtector']
+    __all__ = ['HTMLParser', 'TermProtector', 'unified_diff']
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
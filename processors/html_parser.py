@@ -4,23 +4,107 @@ HTML解析器
 """
 
 from bs4 import BeautifulSoup
-from typing import Dict, List, Tuple
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import hashlib
 import re
+import threading
+
+# 优先使用基于C实现的lxml解析器
+try:
+    import lxml  # noqa: F401
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
 
 
 class HTMLParser:
-    """HTML解析和还原处理器"""
+    """
+    HTML解析和还原处理器
+    
+    解析器本身不保存单篇文档的状态：代码块通过 extract 返回并显式传给还原方法，
+    extract_text 记录的代码块按线程隔离，因此同一实例可以被多个线程共享。
+    """
+    
+    # 代码块标签
+    _CODE_TAGS = ['code', 'pre']
+    # 可能包含文本段落的标签
+    _TEXT_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'div']
+    # 段落级标签（包含这些子标签的元素不作为段落处理）
+    _BLOCK_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+    # 代码块占位符及匹配任意序号占位符的正则（还原时一次扫描完成替换）
+    code_placeholder = "___CODE_BLOCK_{}___"
+    _CODE_PLACEHOLDER_RE = re.compile(r'___CODE_BLOCK_(\d+)___')
+    # 分离代码块和普通文本
+    _CODE_SPLIT_RE = re.compile(r'(<pre>.*?</pre>|<code>.*?</code>)', re.DOTALL)
+    # 连续三个以上的换行
+    _MULTI_NL_RE = re.compile(r'\n{3,}')
+    # 标题关键词（simple_restore中用于识别标题行）
+    _TITLE_KW_RE = re.compile(r'指南|Hook|总结|为什么|如何')
+    _H1_RE = re.compile(r'完全指南')
+    # 标题行不以这些标点结尾
+    _SENTENCE_ENDINGS = frozenset('。.，')
+    # simple_restore 输出的HTML骨架
+    _HTML_HEAD = ('<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n'
+                  '<meta charset="utf-8">\n</head>\n<body>')
+    _HTML_FOOT = '</body>\n</html>'
+    # restore_html 的输出就是解析后的文档：lxml会为HTML片段补上<html><body>，
+    # 因此还原时固定使用html.parser，保持原始文档结构
+    _RESTORE_PARSER = 'html.parser'
+    # 段落位置缓存：原始HTML的blake2b摘要 -> 段落在 find_all(_TEXT_TAGS) 结果中的序号
+    _PARAGRAPH_CACHE_SIZE = 64
+    _paragraph_cache: 'OrderedDict[bytes, Tuple[int, ...]]' = OrderedDict()
+    _paragraph_lock = threading.Lock()
     
-    def __init__(self, preserve_code: bool = True):
+    def __init__(self, preserve_code: bool = True, parser: str = 'lxml'):
         """
         初始化HTML解析器
         
         Args:
             preserve_code: 是否保留代码块
+            parser: 提取文本使用的BeautifulSoup解析器，lxml未安装时回退到html.parser
+                （restore_html 固定使用html.parser）
         """
+        if parser == 'lxml' and not LXML_AVAILABLE:
+            parser = 'html.parser'
+        self.parser = parser
         self.preserve_code = preserve_code
-        self.code_blocks = []
-        self.code_placeholder = "___CODE_BLOCK_{}___"
+        self._local = threading.local()
+    
+    @property
+    def code_blocks(self) -> List[str]:
+        """当前线程最近一次 extract_text 提取的代码块"""
+        return getattr(self._local, 'code_blocks', [])
+    
+    @code_blocks.setter
+    def code_blocks(self, blocks: List[str]) -> None:
+        self._local.code_blocks = blocks
+    
+    def get_scratch(self) -> List[str]:
+        """
+        获取当前线程专用的字符串拼接缓冲区
+        
+        Returns:
+            已清空的缓冲区列表
+        """
+        scratch = getattr(self._local, 'scratch', None)
+        if scratch is None:
+            scratch = self._local.scratch = []
+        scratch.clear()
+        return scratch
+        
+    @staticmethod
+    def is_html(content: str) -> bool:
+        """
+        判断内容是否为HTML（以标签开头）
+        
+        Args:
+            content: 文件内容
+            
+        Returns:
+            是否为HTML
+        """
+        return content.lstrip()[:1] == '<'
         
     def extract_text(self, html_content: str) -> str:
         """
@@ -32,51 +116,67 @@ class HTMLParser:
         Returns:
             纯文本内容
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
+        text, self.code_blocks = self.extract(html_content)
+        return text
+    
+    def extract(self, html_content: str) -> Tuple[str, List[str]]:
+        """
+        从HTML中提取纯文本和代码块（不修改解析器状态）
+        
+        Args:
+            html_content: HTML内容
+            
+        Returns:
+            (纯文本内容, 代码块列表)
+        """
+        soup = BeautifulSoup(html_content, self.parser)
         
         # 保存代码块
-        if self.preserve_code:
-            self._extract_code_blocks(soup)
+        code_blocks = self._extract_code_blocks(soup) if self.preserve_code else []
         
         # 提取文本
         text = soup.get_text(separator='\n', strip=True)
         
         # 清理多余空行
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        text = self._MULTI_NL_RE.sub('\n\n', text)
         
-        return text.strip()
+        return text.strip(), code_blocks
     
-    def _extract_code_blocks(self, soup: BeautifulSoup) -> None:
+    def _extract_code_blocks(self, soup: BeautifulSoup) -> List[str]:
         """提取并保护代码块"""
-        self.code_blocks = []
+        code_blocks = []
         
         # 查找所有代码块标签
-        code_tags = soup.find_all(['code', 'pre'])
+        code_tags = soup.find_all(self._CODE_TAGS)
         
         for idx, tag in enumerate(code_tags):
             # 保存原始代码
             code_content = str(tag)
-            self.code_blocks.append(code_content)
+            code_blocks.append(code_content)
             
             # 替换为占位符
             placeholder = self.code_placeholder.format(idx)
             tag.replace_with(placeholder)
+        
+        return code_blocks
     
-    def restore_html(self, original_html: str, rewritten_text: str) -> str:
+    def restore_html(self, original_html: str, rewritten_text: str,
+                     code_blocks: Optional[List[str]] = None) -> str:
         """
         将改写后的文本还原为HTML格式
         
         Args:
             original_html: 原始HTML
             rewritten_text: 改写后的纯文本
+            code_blocks: 代码块列表，默认使用当前线程 extract_text 提取的代码块
             
         Returns:
             还原后的HTML
         """
-        soup = BeautifulSoup(original_html, 'html.parser')
+        soup = BeautifulSoup(original_html, self._RESTORE_PARSER)
         
         # 获取原始文本段落
-        original_paragraphs = self._get_paragraphs(soup)
+        original_paragraphs = self._get_paragraphs(soup, original_html)
         
         # 分割改写后的文本
         rewritten_paragraphs = [p.strip() for p in rewritten_text.split('\n\n') if p.strip()]
@@ -87,22 +187,50 @@ class HTMLParser:
         # 还原代码块
         html_str = str(soup)
         if self.preserve_code:
-            html_str = self._restore_code_blocks(html_str)
+            html_str = self._restore_code_blocks(html_str, code_blocks)
         
         return html_str
     
-    def _get_paragraphs(self, soup: BeautifulSoup) -> List:
-        """获取所有文本段落元素"""
+    def _get_paragraphs(self, soup: BeautifulSoup, html_str: Optional[str] = None) -> List:
+        """
+        获取所有文本段落元素
+        
+        同一份HTML多次还原时，直接复用缓存的段落位置，
+        省去对每个标签的文本提取和子标签查找
+        
+        Args:
+            soup: 由html_str解析得到的文档
+            html_str: 原始HTML，作为缓存键（不传则不缓存）
+            
+        Returns:
+            段落标签列表
+        """
         # 查找所有可能包含文本的标签
-        text_tags = soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'div'])
+        text_tags = soup.find_all(self._TEXT_TAGS)
         
-        paragraphs = []
-        for tag in text_tags:
+        key = None
+        indices = None
+        if html_str is not None:
+            # 以摘要为键，缓存不持有整篇文档
+            key = hashlib.blake2b(html_str.encode('utf-8'), digest_size=16).digest()
+            with self._paragraph_lock:
+                indices = self._paragraph_cache.get(key)
+                if indices is not None:
+                    self._paragraph_cache.move_to_end(key)
+        
+        if indices is None:
             # 只处理直接包含文本的标签
-            if tag.get_text(strip=True) and not tag.find(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                paragraphs.append(tag)
+            indices = tuple(
+                idx for idx, tag in enumerate(text_tags)
+                if tag.get_text(strip=True) and not tag.find(self._BLOCK_TAGS)
+            )
+            if key is not None:
+                with self._paragraph_lock:
+                    self._paragraph_cache[key] = indices
+                    while len(self._paragraph_cache) > self._PARAGRAPH_CACHE_SIZE:
+                        self._paragraph_cache.popitem(last=False)
         
-        return paragraphs
+        return [text_tags[idx] for idx in indices]
     
     def _replace_paragraphs(self, soup: BeautifulSoup, original_tags: List, rewritten_paragraphs: List) -> None:
         """替换段落内容"""
@@ -116,37 +244,41 @@ class HTMLParser:
             # 保留标签，只替换文本内容
             tag.string = new_text
     
-    def _restore_code_blocks(self, html_str: str) -> str:
+    def _restore_code_blocks(self, html_str: str, code_blocks: Optional[List[str]] = None) -> str:
         """还原代码块"""
-        for idx, code_content in enumerate(self.code_blocks):
-            placeholder = self.code_placeholder.format(idx)
-            html_str = html_str.replace(placeholder, code_content)
+        if code_blocks is None:
+            code_blocks = self.code_blocks
         
-        return html_str
+        if not code_blocks:
+            return html_str
+        
+        def replace(match) -> str:
+            idx = int(match.group(1))
+            return code_blocks[idx] if idx < len(code_blocks) else match.group(0)
+        
+        return self._CODE_PLACEHOLDER_RE.sub(replace, html_str)
     
-    def simple_restore(self, rewritten_text: str) -> str:
+    def simple_restore(self, rewritten_text: str, code_blocks: Optional[List[str]] = None) -> str:
         """
         简单还原：将文本转换为基本HTML
         
         Args:
             rewritten_text: 改写后的文本
+            code_blocks: 代码块列表，默认使用当前线程 extract_text 提取的代码块
             
         Returns:
             HTML格式
         """
-        html_parts = ['<!DOCTYPE html>', '<html lang="zh-CN">', '<head>', 
-                     '<meta charset="utf-8">', '</head>', '<body>']
+        # 只收集正文部分，骨架为固定常量
+        html_parts = self.get_scratch()
         
         # 先还原代码块
         text_with_code = rewritten_text
         if self.preserve_code:
-            text_with_code = self._restore_code_blocks(rewritten_text)
-        
-        # 使用正则表达式分离代码块和普通文本
-        import re
+            text_with_code = self._restore_code_blocks(rewritten_text, code_blocks)
         
         # 分割代码块和文本
-        parts = re.split(r'(<pre>.*?</pre>|<code>.*?</code>)', text_with_code, flags=re.DOTALL)
+        parts = self._CODE_SPLIT_RE.split(text_with_code)
         
         for part in parts:
             part = part.strip()
@@ -174,19 +306,16 @@ class HTMLParser:
                             continue
                         
                         # 判断是否是标题
-                        is_title = False
-                        if len(line) < 50 and not line.endswith('。') and not line.endswith('.') and not line.endswith('，'):
-                            if any(keyword in line for keyword in ['指南', 'Hook', '总结', '为什么', '如何']):
-                                is_title = True
+                        is_title = (len(line) < 50
+                                    and line[-1] not in self._SENTENCE_ENDINGS
+                                    and self._TITLE_KW_RE.search(line) is not None)
                         
                         if is_title:
-                            if '完全指南' in line:
+                            if self._H1_RE.search(line):
                                 html_parts.append(f'<h1>{line}</h1>')
                             else:
                                 html_parts.append(f'<h2>{line}</h2>')
                         else:
                             html_parts.append(f'<p>{line}</p>')
         
-        html_parts.extend(['</body>', '</html>'])
-        
-        return '\n'.join(html_parts)
+        return '\n'.join((self._HTML_HEAD, *html_parts, self._HTML_FOOT))
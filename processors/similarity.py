@@ -3,21 +3,55 @@
 使用sentence-transformers计算文本相似度
 """
 
-from typing import Optional
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, Union
 
 
 class SimilarityChecker:
     """文本相似度检测器"""
     
-    def __init__(self, model_name: str = 'paraphrase-multilingual-MiniLM-L12-v2'):
+    # embedding缓存的最大条目数
+    EMBEDDING_CACHE_SIZE = 1024
+    # 批量检测时低于此数量直接串行计算，避免线程池开销
+    PARALLEL_MIN_PAIRS = 64
+    # int8量化的缩放系数
+    INT8_SCALE = 127
+    # 字符n-gram的Jaccard高于此值时视为几乎未改写，跳过模型计算
+    JACCARD_SKIP = 0.95
+    
+    def __init__(self, model_name: str = 'paraphrase-multilingual-MiniLM-L12-v2',
+                 device: Optional[str] = None, quantize: bool = False):
         """
         初始化相似度检测器
         
         Args:
             model_name: 使用的模型名称
+            device: 运行设备（如 cuda/cpu），默认有GPU时使用cuda
+            quantize: 是否将缓存的embedding量化为int8（内存占用为float32的1/4，精度略有损失）
         """
         self.model_name = model_name
         self.model = None
+        self.device = device
+        self.quantize = quantize
+        # 向量相似度函数，模型加载时确定（优先使用SimSIMD）
+        self._cos = None
+        # 最近一次候选文本集合及其embedding矩阵
+        self._candidate_key = None
+        self._candidate_matrix = None
+        # 文本哈希 -> 归一化embedding（quantize时为int8）的LRU缓存
+        self._embedding_cache: OrderedDict = OrderedDict()
+        self._embedding_lock = threading.Lock()
+        # 状态信息输出函数，为None时不输出
+        self.echo: Optional[Callable[[str], None]] = print
+    
+    def _echo(self, message: str) -> None:
+        """输出状态信息"""
+        if self.echo is not None:
+            self.echo(message)
         
     def _load_model(self):
         """延迟加载模型"""
@@ -29,14 +63,56 @@ class SimilarityChecker:
                     "相似度检测需要numpy。安装: pip install numpy sentence-transformers"
                 )
             try:
+                import torch
                 from sentence_transformers import SentenceTransformer
-                print("正在加载相似度检测模型...")
-                self.model = SentenceTransformer(self.model_name)
-                print("✓ 模型加载完成")
+                self._echo("正在加载相似度检测模型...")
+                if self.device is None:
+                    self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+                self.model = SentenceTransformer(self.model_name, device=self.device)
+                if str(self.device).startswith('cuda'):
+                    # GPU上使用FP16推理，减少显存带宽占用
+                    self.model.half()
+                self._echo("✓ 模型加载完成")
             except ImportError:
                 raise ImportError(
                     "请安装sentence-transformers: pip install sentence-transformers"
                 )
+        if self._cos is None:
+            self._cos = self._select_cosine()
+    
+    def _select_cosine(self):
+        """选择向量相似度实现：有SimSIMD时使用其SIMD内核，否则使用numpy"""
+        import numpy as np
+        try:
+            import simsimd
+        except ImportError:
+            simsimd = None
+        
+        if self.quantize:
+            if simsimd is not None:
+                # int8向量直接使用SimSIMD的int8内核
+                return lambda a, b: 1.0 - float(simsimd.cosine(a, b, 'int8'))
+            
+            def int8_cosine(a, b) -> float:
+                # 升为int32累加，避免int8溢出；按量化后的实际模长归一化，与SimSIMD结果一致
+                a = a.astype(np.int32)
+                b = b.astype(np.int32)
+                denom = np.sqrt(float(np.dot(a, a)) * float(np.dot(b, b)))
+                return float(np.dot(a, b)) / denom if denom else 0.0
+            
+            return int8_cosine
+        
+        if simsimd is None:
+            # 输入向量已归一化，点积即余弦相似度
+            return lambda a, b: float(np.dot(a, b))
+        
+        def cosine(a, b) -> float:
+            # SimSIMD要求连续的float32数组，返回的是余弦距离
+            a = np.ascontiguousarray(a, dtype=np.float32)
+            b = np.ascontiguousarray(b, dtype=np.float32)
+            return 1.0 - float(simsimd.cosine(a, b))
+        
+        return cosine
     
     def calculate_similarity(self, text1: str, text2: str) -> float:
         """
@@ -51,40 +127,296 @@ class SimilarityChecker:
         """
         self._load_model()
         
-        # 生成embeddings
-        embeddings = self.model.encode([text1, text2])
+        # 生成归一化的embeddings，余弦相似度即点积
+        embeddings = self._encode_cached([text1, text2])
+        
+        return self._cos(embeddings[0], embeddings[1])
+    
+    def _encode_cached(self, texts: List[str]) -> list:
+        """
+        生成归一化的embedding，相同文本直接复用缓存
+        
+        未命中的文本合并为一次encode调用
         
-        # 计算余弦相似度
-        similarity = self._cosine_similarity(embeddings[0], embeddings[1])
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            与texts一一对应的向量列表
+        """
+        keys = [hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest() for text in texts]
+        cache = self._embedding_cache
+        results = [None] * len(texts)
+        misses = {}
+        
+        with self._embedding_lock:
+            for i, key in enumerate(keys):
+                embedding = cache.get(key)
+                if embedding is None:
+                    misses.setdefault(key, []).append(i)
+                else:
+                    cache.move_to_end(key)
+                    results[i] = embedding
+        
+        if misses:
+            miss_texts = [texts[indices[0]] for indices in misses.values()]
+            encoded = self.model.encode(miss_texts, normalize_embeddings=True, show_progress_bar=False)
+            if self.quantize:
+                encoded = self._quantize(encoded)
+            with self._embedding_lock:
+                for (key, indices), embedding in zip(misses.items(), encoded):
+                    for i in indices:
+                        results[i] = embedding
+                    cache[key] = embedding
+                while len(cache) > self.EMBEDDING_CACHE_SIZE:
+                    cache.popitem(last=False)
+        
+        return results
+    
+    def _quantize(self, embeddings):
+        """
+        将归一化的embedding量化为int8
+        
+        Args:
+            embeddings: (N, d) 归一化向量
+            
+        Returns:
+            (N, d) 连续的int8数组
+        """
+        import numpy as np
+        scale = self.INT8_SCALE
+        quantized = np.clip(np.round(np.asarray(embeddings, dtype=np.float32) * scale), -scale, scale)
+        return np.ascontiguousarray(quantized, dtype=np.int8)
+    
+    def encode_batch(self, texts: List[str], batch_size: int = 64):
+        """
+        批量生成归一化的embedding，结果保留在模型所在设备上
         
-        return float(similarity)
+        Args:
+            texts: 文本列表
+            batch_size: 编码批大小
+            
+        Returns:
+            (N, d) 的torch张量
+        """
+        self._load_model()
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_tensor=True,
+            normalize_embeddings=True,
+            device=self.device,
+            show_progress_bar=False,
+        )
     
-    def _cosine_similarity(self, vec1, vec2) -> float:
-        """计算余弦相似度"""
+    def calculate_similarity_batch(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        批量计算多组文本的相似度
+        
+        所有文本合并为一次encode调用（按长度排序分批，减少padding），
+        向量已归一化，余弦相似度即逐行点积；在GPU上时向量不拷回主机，
+        只传回最终的N个分数
+        
+        Args:
+            pairs: (文本1, 文本2) 列表
+            
+        Returns:
+            每组文本的相似度
+        """
+        if not pairs:
+            return []
+        
+        self._load_model()
         import numpy as np
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
         
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
+        texts = [text for pair in pairs for text in pair]
+        if str(self.device).startswith('cuda'):
+            embeddings = self.encode_batch(texts).reshape(len(pairs), 2, -1)
+            return (embeddings[:, 0] * embeddings[:, 1]).sum(dim=1).float().cpu().tolist()
+        
+        embeddings = self.model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).reshape(len(pairs), 2, -1)
         
-        return dot_product / (norm1 * norm2)
+        return np.einsum('ij,ij->i', embeddings[:, 0], embeddings[:, 1]).tolist()
     
-    def check_quality(self, original: str, rewritten: str, threshold: float = 0.3) -> dict:
+    def calculate_similarity_matrix(self, query: str, candidates: List[str]):
+        """
+        计算一段文本与多个候选文本的相似度
+        
+        候选文本编码为矩阵后一次矩阵-向量乘法得到全部分数，
+        候选集合不变时复用上次的矩阵，只需编码query
+        
+        Args:
+            query: 待比较的文本
+            candidates: 候选文本列表
+            
+        Returns:
+            (n,) 的numpy数组，与candidates一一对应
+        """
+        self._load_model()
+        import numpy as np
+        
+        if not candidates:
+            return np.zeros(0, dtype=np.float32)
+        
+        key = tuple(candidates)
+        if key != self._candidate_key:
+            self._candidate_matrix = np.ascontiguousarray(self.model.encode(
+                list(candidates),
+                batch_size=64,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            ), dtype=np.float32)
+            self._candidate_key = key
+        
+        q = self.model.encode([query], normalize_embeddings=True, show_progress_bar=False)[0]
+        return self._candidate_matrix @ np.asarray(q, dtype=np.float32)
+    
+    def check_quality(self, original: Union[str, List[str]], rewritten: Union[str, List[str]],
+                      threshold: float = 0.3) -> Union[dict, List[dict]]:
         """
         检查改写质量
         
+        Args:
+            original: 原始文本，或原始文本列表
+            rewritten: 改写后文本，或与original一一对应的列表
+            threshold: 相似度阈值（低于此值为合格）
+            
+        Returns:
+            质量报告字典；传入列表时返回报告列表
+        """
+        if isinstance(original, str):
+            similarity = self._quick_similarity(original, rewritten, threshold)
+            if similarity is None:
+                similarity = self.calculate_similarity(original, rewritten)
+            return self.build_report(similarity, threshold)
+        
+        similarities = self._prefiltered_similarities(
+            list(zip(original, rewritten)), threshold, self.calculate_similarity_batch
+        )
+        return [self.build_report(similarity, threshold) for similarity in similarities]
+    
+    def _prefiltered_similarities(self, pairs: List[Tuple[str, str]], threshold: float,
+                                  score_batch) -> List[float]:
+        """
+        批量计算相似度，能快速判定的文本不经过模型
+        
+        Args:
+            pairs: (原始文本, 改写后文本) 列表
+            threshold: 相似度阈值
+            score_batch: 对剩余文本批量计算相似度的函数
+            
+        Returns:
+            与pairs一一对应的相似度
+        """
+        similarities = [self._quick_similarity(a, b, threshold) for a, b in pairs]
+        
+        # 只对无法直接判定的文本调用模型
+        pending = [i for i, similarity in enumerate(similarities) if similarity is None]
+        if pending:
+            computed = score_batch([pairs[i] for i in pending])
+            for i, similarity in zip(pending, computed):
+                similarities[i] = similarity
+        
+        return similarities
+    
+    def _quick_similarity(self, original: str, rewritten: str, threshold: float) -> Optional[float]:
+        """
+        不经过模型的快速判定：文本相同或几乎相同时一定不合格
+        
+        字面重合度低并不代表语义不同（正常的改写本就如此），这种情况仍交给模型判断
+        
         Args:
             original: 原始文本
             rewritten: 改写后文本
+            threshold: 相似度阈值
+            
+        Returns:
+            可直接判定时返回相似度，否则返回None
+        """
+        if original == rewritten:
+            return 1.0
+        jaccard = self._quick_jaccard(original, rewritten)
+        if jaccard > self.JACCARD_SKIP and jaccard >= threshold:
+            return jaccard
+        return None
+    
+    @staticmethod
+    def _quick_jaccard(a: str, b: str, n: int = 5) -> float:
+        """
+        计算两段文本字符n-gram集合的Jaccard系数
+        
+        Args:
+            a: 文本1
+            b: 文本2
+            n: n-gram长度
+            
+        Returns:
+            Jaccard系数 (0-1)，任一文本短于n时返回0
+        """
+        shingles_a = {a[i:i + n] for i in range(len(a) - n + 1)}
+        shingles_b = {b[i:i + n] for i in range(len(b) - n + 1)}
+        if not shingles_a or not shingles_b:
+            return 0.0
+        intersection = len(shingles_a & shingles_b)
+        return intersection / (len(shingles_a) + len(shingles_b) - intersection)
+    
+    def check_quality_batch(self, pairs: List[Tuple[str, str]], threshold: float = 0.3,
+                            workers: Optional[int] = None) -> List[dict]:
+        """
+        并行检查多组文本的改写质量
+        
+        与 check_quality 使用相同的快速判定；其余pairs按线程数切分成若干组，
+        每个线程对一组调用calculate_similarity_batch（PyTorch推理时会释放GIL，线程即可并行）
+        
+        Args:
+            pairs: (原始文本, 改写后文本) 列表
             threshold: 相似度阈值（低于此值为合格）
+            workers: 线程数，默认按CPU核数
             
         Returns:
-            质量报告字典
+            与pairs一一对应的质量报告列表
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return []
+        
+        workers = workers or min(4, os.cpu_count() or 1)
+        
+        def score_parallel(pending: List[Tuple[str, str]]) -> List[float]:
+            if len(pending) < self.PARALLEL_MIN_PAIRS or workers <= 1:
+                return self.calculate_similarity_batch(pending)
+            # 先在主线程加载模型，避免多个线程同时加载
+            self._load_model()
+            size = -(-len(pending) // workers)
+            chunks = [pending[i:i + size] for i in range(0, len(pending), size)]
+            with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+                return [
+                    similarity
+                    for chunk in executor.map(self.calculate_similarity_batch, chunks)
+                    for similarity in chunk
+                ]
+        
+        similarities = self._prefiltered_similarities(pairs, threshold, score_parallel)
+        return [self.build_report(similarity, threshold) for similarity in similarities]
+    
+    def build_report(self, similarity: float, threshold: float = 0.3) -> dict:
         """
-        similarity = self.calculate_similarity(original, rewritten)
+        根据相似度生成质量报告
         
+        Args:
+            similarity: 相似度分数
+            threshold: 相似度阈值（低于此值为合格）
+            
+        Returns:
+            质量报告字典
+        """
         return {
             'similarity': similarity,
             'threshold': threshold,
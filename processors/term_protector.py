@@ -6,6 +6,9 @@
 import re
 from typing import List, Dict, Tuple
 
+# 英文单词字符，用于判断术语首尾是否需要边界
+_ASCII_WORD = re.compile(r'[A-Za-z0-9_]')
+
 
 class TermProtector:
     """专业术语保护器"""
@@ -17,9 +20,89 @@ class TermProtector:
         Args:
             protected_terms: 需要保护的术语列表
         """
-        self.protected_terms = protected_terms
+        # 术语列表初始化后不再变化，预编译的正则都依赖于它
+        self.protected_terms = tuple(protected_terms)
         self.term_map = {}
         self.placeholder_prefix = "___TERM_"
+        # 匹配任意序号的术语占位符
+        self._restore_pattern = re.compile(re.escape(self.placeholder_prefix) + r'\d+___')
+        
+        # 术语 -> 在protected_terms中的序号（重复术语取第一次出现）
+        self._term_to_idx = {}
+        for idx, term in enumerate(self.protected_terms):
+            if term:
+                self._term_to_idx.setdefault(term, idx)
+        
+        # 每个术语的正则只生成一次
+        term_regexes = {term: self._term_regex(term) for term in self._term_to_idx}
+        
+        # 每个术语单独预编译，供 _extract_terms 使用
+        self._term_patterns = tuple(
+            (term, re.compile(regex)) for term, regex in term_regexes.items()
+        )
+        
+        # 所有术语合并为一个正则，长术语优先匹配，一次扫描完成替换
+        sorted_terms = sorted(term_regexes, key=len, reverse=True)
+        self._pattern = re.compile(
+            '|'.join(term_regexes[term] for term in sorted_terms)
+        ) if sorted_terms else None
+        # 安装了pyahocorasick时用自动机一次扫描找出所有术语
+        self._automaton = self._build_automaton()
+    
+    def _build_automaton(self):
+        """构建Aho-Corasick自动机，依赖缺失或没有术语时返回None（使用正则）"""
+        if not self._term_to_idx:
+            return None
+        try:
+            import ahocorasick
+        except ImportError:
+            return None
+        
+        automaton = ahocorasick.Automaton()
+        for term, idx in self._term_to_idx.items():
+            # 同时记录首尾是否需要英文单词边界
+            automaton.add_word(term, (idx, term,
+                                      bool(_ASCII_WORD.match(term[0])),
+                                      bool(_ASCII_WORD.match(term[-1]))))
+        automaton.make_automaton()
+        return automaton
+    
+    def _iter_hits(self, text: str):
+        """
+        用自动机查找满足边界条件的术语出现位置（可能互相重叠）
+        
+        Yields:
+            (start, end, idx, term)
+        """
+        size = len(text)
+        for last, (idx, term, left, right) in self._automaton.iter(text):
+            start, end = last - len(term) + 1, last + 1
+            if left and start > 0 and _ASCII_WORD.match(text[start - 1]):
+                continue
+            if right and end < size and _ASCII_WORD.match(text[end]):
+                continue
+            yield start, end, idx, term
+    
+    @staticmethod
+    def _term_regex(term: str) -> str:
+        """
+        生成单个术语的匹配正则
+        
+        只在术语首尾为英文字母/数字时要求边界，
+        中文没有词边界，\\b 在中英文混排时会导致匹配失败
+        
+        Args:
+            term: 术语
+            
+        Returns:
+            正则表达式字符串
+        """
+        pattern = re.escape(term)
+        if _ASCII_WORD.match(term[0]):
+            pattern = r'(?<![A-Za-z0-9_])' + pattern
+        if _ASCII_WORD.match(term[-1]):
+            pattern += r'(?![A-Za-z0-9_])'
+        return pattern
         
     def protect(self, text: str) -> str:
         """
@@ -32,19 +115,42 @@ class TermProtector:
             替换后的文本
         """
         self.term_map = {}
-        protected_text = text
+        if self._pattern is None:
+            return text
         
-        for idx, term in enumerate(self.protected_terms):
-            # 使用正则表达式进行全词匹配
-            pattern = r'\b' + re.escape(term) + r'\b'
+        # 逐段拼接，整篇文本只复制一次
+        parts = []
+        last = 0
+        for start, end, idx, term in self._iter_matches(text):
             placeholder = f"{self.placeholder_prefix}{idx}___"
-            
-            # 记录替换
-            if re.search(pattern, protected_text):
-                self.term_map[placeholder] = term
-                protected_text = re.sub(pattern, placeholder, protected_text)
+            # 只记录实际出现的术语
+            self.term_map[placeholder] = term
+            parts.append(text[last:start])
+            parts.append(placeholder)
+            last = end
+        parts.append(text[last:])
+        return ''.join(parts)
+    
+    def _iter_matches(self, text: str):
+        """
+        按顺序查找不重叠的术语出现位置，同一位置取最长术语
         
-        return protected_text
+        Yields:
+            (start, end, idx, term)
+        """
+        if self._automaton is None:
+            term_to_idx = self._term_to_idx
+            for match in self._pattern.finditer(text):
+                term = match.group(0)
+                yield match.start(), match.end(), term_to_idx[term], term
+            return
+        
+        last = 0
+        for hit in sorted(self._iter_hits(text), key=lambda hit: (hit[0], -hit[1])):
+            # 跳过与已选匹配重叠的部分
+            if hit[0] >= last:
+                last = hit[1]
+                yield hit
     
     def restore(self, text: str) -> str:
         """
@@ -56,12 +162,14 @@ class TermProtector:
         Returns:
             还原后的文本
         """
-        restored_text = text
-        
-        for placeholder, term in self.term_map.items():
-            restored_text = restored_text.replace(placeholder, term)
+        if not self.term_map:
+            return text
         
-        return restored_text
+        # 一次扫描替换所有占位符，未记录的占位符保持原样
+        term_map = self.term_map
+        return self._restore_pattern.sub(
+            lambda match: term_map.get(match.group(0), match.group(0)), text
+        )
     
     def verify(self, original: str, rewritten: str) -> Dict[str, any]:
         """
@@ -90,11 +198,16 @@ class TermProtector:
     
     def _extract_terms(self, text: str) -> set:
         """提取文本中出现的保护术语"""
+        if self._automaton is not None:
+            return {term for _, _, _, term in self._iter_hits(text)}
+        
         found_terms = set()
         
-        for term in self.protected_terms:
-            pattern = r'\b' + re.escape(term) + r'\b'
-            if re.search(pattern, text):
+        for term, pattern in self._term_patterns:
+            # 先做子串判断，大部分不出现的术语无需进入正则匹配
+            if term not in text:
+                continue
+            if pattern.search(text):
                 found_terms.add(term)
         
         return found_terms
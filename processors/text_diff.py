@@ -0,0 +1,165 @@
+"""
+文本差异对比
+基于行哈希的线性差异算法，避免difflib在长文本上的平方级开销
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def _hash_lines(lines: Sequence[str]) -> array:
+    """将每行文本哈希为64位整数，后续比较只需整数比较"""
+    return array('q', (hash(line) for line in lines))
+
+
+def iter_opcodes(a: Sequence[str], b: Sequence[str]) -> Iterator[Opcode]:
+    """
+    逐段生成差异操作码（格式同difflib.SequenceMatcher.get_opcodes）
+
+    遇到不同的行时，借助行哈希索引找到最近的重新对齐点，
+    整体接近线性时间，且按需惰性生成。
+
+    Args:
+        a: 原文行列表
+        b: 新文本行列表
+
+    Yields:
+        (tag, i1, i2, j1, j2)，tag 为 equal/replace/delete/insert
+    """
+    ha = _hash_lines(a)
+    hb = _hash_lines(b)
+    n, m = len(ha), len(hb)
+
+    # 新文本中每个行哈希出现的位置（升序）
+    positions: Dict[int, List[int]] = {}
+    for j, h in enumerate(hb):
+        positions.setdefault(h, []).append(j)
+
+    i = j = 0
+    while i < n and j < m:
+        # 相同的行
+        i0, j0 = i, j
+        while i < n and j < m and ha[i] == hb[j] and a[i] == b[j]:
+            i += 1
+            j += 1
+        if i > i0:
+            yield ('equal', i0, i, j0, j)
+        if i >= n or j >= m:
+            break
+
+        # 寻找跳过行数最少的重新对齐点
+        best_i, best_j = n, m
+        best_cost = (n - i) + (m - j)
+        for i2 in range(i, n):
+            if i2 - i >= best_cost:
+                break
+            candidates = positions.get(ha[i2])
+            if not candidates:
+                continue
+            for k in range(bisect_left(candidates, j), len(candidates)):
+                j2 = candidates[k]
+                cost = (i2 - i) + (j2 - j)
+                if cost >= best_cost:
+                    break
+                # 哈希相同时再确认文本相同
+                if a[i2] == b[j2]:
+                    best_i, best_j, best_cost = i2, j2, cost
+                    break
+
+        if best_i > i and best_j > j:
+            yield ('replace', i, best_i, j, best_j)
+        elif best_i > i:
+            yield ('delete', i, best_i, j, j)
+        else:
+            yield ('insert', i, i, j, best_j)
+        i, j = best_i, best_j
+
+    if i < n:
+        yield ('delete', i, n, j, j)
+    elif j < m:
+        yield ('insert', i, i, j, m)
+
+
+def _iter_grouped_opcodes(codes: Iterator[Opcode], n: int) -> Iterator[List[Opcode]]:
+    """按上下文行数将操作码分组为hunk（逻辑同difflib.get_grouped_opcodes）"""
+    current = next(codes, None)
+    if current is None:
+        return
+
+    # 开头的相同段只保留最后n行上下文
+    if current[0] == 'equal':
+        tag, i1, i2, j1, j2 = current
+        current = (tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2)
+
+    nn = n + n
+    group: List[Opcode] = []
+    while current is not None:
+        following = next(codes, None)
+        tag, i1, i2, j1, j2 = current
+
+        # 结尾的相同段只保留开头n行上下文
+        if following is None and tag == 'equal':
+            i2, j2 = min(i2, i1 + n), min(j2, j1 + n)
+
+        if tag == 'equal' and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+        current = following
+
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def _format_range(start: int, stop: int) -> str:
+    """生成unified diff的行号范围"""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+
+def unified_diff(a: Sequence[str], b: Sequence[str], fromfile: str = '',
+                 tofile: str = '', n: int = 3) -> Iterator[str]:
+    """
+    生成unified格式的差异行（不含行尾换行符）
+
+    Args:
+        a: 原文行列表
+        b: 新文本行列表
+        fromfile: 原文标题
+        tofile: 新文本标题
+        n: 上下文行数
+
+    Yields:
+        差异输出的每一行
+    """
+    started = False
+    for group in _iter_grouped_opcodes(iter_opcodes(a, b), n):
+        if not started:
+            started = True
+            yield f'--- {fromfile}'
+            yield f'+++ {tofile}'
+
+        first, last = group[0], group[-1]
+        yield f'@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@'
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in a[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in b[j1:j2]:
+                    yield '+' + line